@@ -13,9 +13,10 @@
 # limitations under the License.
 
 import logging
+import six
 import numpy as np
+from collections import deque, defaultdict
 import paddle.fluid as fluid
-import copy
 from ..core import VarWrapper, OpWrapper, GraphWrapper
 from ..common import get_logger
 
@@ -42,7 +43,8 @@ class Pruner():
               lazy=False,
               only_graph=False,
               param_backup=False,
-              param_shape_backup=False):
+              param_shape_backup=False,
+              clone=True):
         """
         Pruning the given parameters.
         Args:
@@ -57,14 +59,25 @@ class Pruner():
                               False means modifying graph and variables in scope. Default: False.
             param_backup(bool): Whether to return a dict to backup the values of parameters. Default: False.
             param_shape_backup(bool): Whether to return a dict to backup the shapes of parameters. Default: False.
+            clone(bool): Whether to prune a clone of the given program. False means the given program
+                         will be modified in place, which saves the cost of cloning. Default: True.
         Returns:
             Program: The pruned program.
             param_backup: A dict to backup the values of parameters.
             param_shape_backup: A dict to backup the shapes of parameters.
         """
 
-        self.pruned_list = []
-        graph = GraphWrapper(program.clone())
+        graph = GraphWrapper(program.clone() if clone else program)
+        self._ops = graph.ops()
+        self._op_pos = {op.idx(): i for i, op in enumerate(self._ops)}
+        self._param_names = set(
+            [param.name() for param in graph.all_parameters()])
+        self._acc_cache = {}
+        self._opt_ops_by_param = defaultdict(list)
+        for op in self._ops:
+            if op.is_opt_op():
+                for in_var in op.all_inputs():
+                    self._opt_ops_by_param[in_var.name()].append(op)
         param_backup = {} if param_backup else None
         param_shape_backup = {} if param_shape_backup else None
         self._prune_parameters(
@@ -77,7 +90,7 @@ class Pruner():
             only_graph=only_graph,
             param_backup=param_backup,
             param_shape_backup=param_shape_backup)
-        for op in graph.ops():
+        for op in self._ops:
             if op.type() == 'depthwise_conv2d' or op.type(
             ) == 'depthwise_conv2d_grad':
                 op.set_attr('groups', op.inputs('Filter')[0].shape()[0])
@@ -103,60 +116,66 @@ class Pruner():
                         False means cutting down the pruned elements.
             only_graph(bool): True means only modifying the graph.
                               False means modifying graph and variables in  scope.
+        Returns:
+            tuple: The indexes to be pruned and the boolean mask of pruned indexes.
+                   The mask is None if only_graph is True.
         """
         if params[0].name() in self.pruned_list[0]:
-            return
+            return None, None
 
         if only_graph:
             pruned_num = int(round(params[0].shape()[0] * ratio))
             for param in params:
+                name = param.name()
                 ori_shape = param.shape()
-                if param_backup is not None and (
-                        param.name() not in param_backup):
-                    param_backup[param.name()] = copy.deepcopy(ori_shape)
+                if param_backup is not None and (name not in param_backup):
+                    param_backup[name] = tuple(ori_shape)
                 new_shape = list(ori_shape)
                 new_shape[0] -= pruned_num
                 param.set_shape(new_shape)
-                _logger.debug("prune [{}] from {} to {}".format(param.name(
-                ), ori_shape, new_shape))
-                self.pruned_list[0].append(param.name())
-            return range(pruned_num)
+                _logger.debug("prune [{}] from {} to {}".format(
+                    name, ori_shape, new_shape))
+                self.pruned_list[0].add(name)
+            return range(pruned_num), None
 
         else:
 
             param_t = scope.find_var(params[0].name()).get_tensor()
-            pruned_idx = self._cal_pruned_idx(
-                params[0].name(), np.array(param_t), ratio, axis=0)
-            for param in params:
+            param_value = np.array(param_t)
+            pruned_idx, pruned_mask = self._cal_pruned_idx(
+                params[0].name(), param_value, ratio, axis=0)
+            for i, param in enumerate(params):
                 assert isinstance(param, VarWrapper)
-                param_t = scope.find_var(param.name()).get_tensor()
-                if param_backup is not None and (
-                        param.name() not in param_backup):
-                    param_backup[param.name()] = copy.deepcopy(
-                        np.array(param_t))
+                name = param.name()
+                ori_shape = param.shape()
+                param_t = scope.find_var(name).get_tensor()
+                if i > 0:
+                    param_value = np.array(param_t)
+                if param_backup is not None and (name not in param_backup):
+                    # lazy pruning sets zeros on param_value in place
+                    param_backup[name] = param_value.copy(
+                    ) if lazy else param_value
                 try:
                     pruned_param = self._prune_tensor(
-                        np.array(param_t),
+                        param_value,
                         pruned_idx,
                         pruned_axis=0,
-                        lazy=lazy)
+                        lazy=lazy,
+                        pruned_mask=pruned_mask)
                 except IndexError as e:
-                    _logger.error("Pruning {}, but get [{}]".format(param.name(
-                    ), e))
+                    _logger.error("Pruning {}, but get [{}]".format(name, e))
 
                 param_t.set(pruned_param, place)
-                ori_shape = param.shape()
                 if param_shape_backup is not None and (
-                        param.name() not in param_shape_backup):
-                    param_shape_backup[param.name()] = copy.deepcopy(
-                        param.shape())
-                new_shape = list(param.shape())
+                        name not in param_shape_backup):
+                    param_shape_backup[name] = tuple(ori_shape)
+                new_shape = list(ori_shape)
                 new_shape[0] = pruned_param.shape[0]
                 param.set_shape(new_shape)
-                _logger.debug("prune [{}] from {} to {}".format(param.name(
-                ), ori_shape, new_shape))
-                self.pruned_list[0].append(param.name())
-            return pruned_idx
+                _logger.debug("prune [{}] from {} to {}".format(
+                    name, ori_shape, new_shape))
+                self.pruned_list[0].add(name)
+            return pruned_idx, pruned_mask
 
     def _prune_parameter_by_idx(self,
                                 scope,
@@ -167,7 +186,8 @@ class Pruner():
                                 lazy=False,
                                 only_graph=False,
                                 param_shape_backup=None,
-                                param_backup=None):
+                                param_backup=None,
+                                pruned_mask=None):
         """
         Pruning parameters in given axis.
         Args:
@@ -180,46 +200,57 @@ class Pruner():
                         False means cutting down the pruned elements.
             only_graph(bool): True means only modifying the graph.
                               False means modifying graph and variables in  scope.
+            pruned_mask(numpy.array): The boolean mask of pruned indexes on axis.
+                                      It will be computed from pruned_idx if it is None.
+                                      Default: None.
         """
         if params[0].name() in self.pruned_list[pruned_axis]:
             return
         if only_graph:
             pruned_num = len(pruned_idx)
             for param in params:
+                name = param.name()
                 ori_shape = param.shape()
-                if param_backup is not None and (
-                        param.name() not in param_backup):
-                    param_backup[param.name()] = copy.deepcopy(ori_shape)
+                if param_backup is not None and (name not in param_backup):
+                    param_backup[name] = tuple(ori_shape)
                 new_shape = list(ori_shape)
                 new_shape[pruned_axis] -= pruned_num
                 param.set_shape(new_shape)
-                _logger.debug("prune [{}] from {} to {}".format(param.name(
-                ), ori_shape, new_shape))
-                self.pruned_list[pruned_axis].append(param.name())
+                _logger.debug("prune [{}] from {} to {}".format(
+                    name, ori_shape, new_shape))
+                self.pruned_list[pruned_axis].add(name)
 
         else:
             for param in params:
                 assert isinstance(param, VarWrapper)
-                param_t = scope.find_var(param.name()).get_tensor()
-                if param_backup is not None and (
-                        param.name() not in param_backup):
-                    param_backup[param.name()] = copy.deepcopy(
-                        np.array(param_t))
+                name = param.name()
+                ori_shape = param.shape()
+                param_t = scope.find_var(name).get_tensor()
+                param_value = np.array(param_t)
+                if param_backup is not None and (name not in param_backup):
+                    # lazy pruning sets zeros on param_value in place
+                    param_backup[name] = param_value.copy(
+                    ) if lazy else param_value
+                if pruned_mask is None and not lazy:
+                    pruned_mask = self._idx_to_mask(
+                        pruned_idx, param_value.shape[pruned_axis])
                 pruned_param = self._prune_tensor(
-                    np.array(param_t), pruned_idx, pruned_axis, lazy=lazy)
+                    param_value,
+                    pruned_idx,
+                    pruned_axis,
+                    lazy=lazy,
+                    pruned_mask=pruned_mask)
                 param_t.set(pruned_param, place)
-                ori_shape = param.shape()
 
                 if param_shape_backup is not None and (
-                        param.name() not in param_shape_backup):
-                    param_shape_backup[param.name()] = copy.deepcopy(
-                        param.shape())
-                new_shape = list(param.shape())
+                        name not in param_shape_backup):
+                    param_shape_backup[name] = tuple(ori_shape)
+                new_shape = list(ori_shape)
                 new_shape[pruned_axis] = pruned_param.shape[pruned_axis]
                 param.set_shape(new_shape)
-                _logger.debug("prune [{}] from {} to {}".format(param.name(
-                ), ori_shape, new_shape))
-                self.pruned_list[pruned_axis].append(param.name())
+                _logger.debug("prune [{}] from {} to {}".format(
+                    name, ori_shape, new_shape))
+                self.pruned_list[pruned_axis].add(name)
 
     def _forward_search_related_op(self, graph, node):
         """
@@ -230,32 +261,31 @@ class Pruner():
         Returns:
             list<OpWrapper>: A list of operators.
         """
-        visited = {}
-        for op in graph.ops():
-            visited[op.idx()] = False
-        stack = []
+        op_pos = self._op_pos
+        visited = bytearray(len(self._ops))
+        stack = deque()
         visit_path = []
         if isinstance(node, VarWrapper):
-            for op in graph.ops():
+            for op in self._ops:
                 if (not op.is_bwd_op()) and (node in op.all_inputs()):
                     next_ops = self._get_next_unvisited_op(graph, visited, op)
                     #                visit_path.append(op)
-                    visited[op.idx()] = True
+                    visited[op_pos[op.idx()]] = 1
                     for next_op in next_ops:
-                        if visited[next_op.idx()] == False:
+                        if not visited[op_pos[next_op.idx()]]:
                             stack.append(next_op)
                             visit_path.append(next_op)
-                            visited[next_op.idx()] = True
+                            visited[op_pos[next_op.idx()]] = 1
         elif isinstance(node, OpWrapper):
             next_ops = self._get_next_unvisited_op(graph, visited, node)
             for next_op in next_ops:
-                if visited[next_op.idx()] == False:
+                if not visited[op_pos[next_op.idx()]]:
                     stack.append(next_op)
                     visit_path.append(next_op)
-                    visited[next_op.idx()] = True
+                    visited[op_pos[next_op.idx()]] = 1
         while len(stack) > 0:
             #top_op = stack[len(stack) - 1]
-            top_op = stack.pop(0)
+            top_op = stack.popleft()
             next_ops = None
             if top_op.type() in ["conv2d", "deformable_conv"]:
                 next_ops = None
@@ -265,10 +295,10 @@ class Pruner():
                 next_ops = self._get_next_unvisited_op(graph, visited, top_op)
             if next_ops != None:
                 for op in next_ops:
-                    if visited[op.idx()] == False:
+                    if not visited[op_pos[op.idx()]]:
                         stack.append(op)
                         visit_path.append(op)
-                        visited[op.idx()] = True
+                        visited[op_pos[op.idx()]] = 1
 
         return visit_path
 
@@ -277,7 +307,8 @@ class Pruner():
         Get next unvisited adjacent operators of given operators.
         Args:
             graph(GraphWrapper): The graph used to search. 
-            visited(list): The ids of operators that has been visited.
+            visited(bytearray): The visiting flags of operators indexed by
+                                their positions in self._ops.
             top_op: The given operator.
         Returns:
             list<OpWrapper>: A list of operators. 
@@ -285,13 +316,14 @@ class Pruner():
         assert isinstance(top_op, OpWrapper)
         next_ops = []
         for op in graph.next_ops(top_op):
-            if (visited[op.idx()] == False) and (not op.is_bwd_op()):
+            if (not visited[self._op_pos[op.idx()]]) and (not op.is_bwd_op()):
                 next_ops.append(op)
         return next_ops
 
     def _get_accumulator(self, graph, param):
         """
         Get accumulators of given parameter. The accumulator was created by optimizer.
+        The result is cached by the name of parameter during one pruning.
         Args:
             graph(GraphWrapper): The graph used to search.
             param(VarWrapper): The given parameter.
@@ -299,13 +331,15 @@ class Pruner():
             list<VarWrapper>: A list of accumulators which are variables.
         """
         assert isinstance(param, VarWrapper)
+        if param.name() in self._acc_cache:
+            return self._acc_cache[param.name()]
         params = []
-        for op in param.outputs():
-            if op.is_opt_op():
-                for out_var in op.all_outputs():
-                    if graph.is_persistable(out_var) and out_var.name(
-                    ) != param.name():
-                        params.append(out_var)
+        for op in self._opt_ops_by_param[param.name()]:
+            for out_var in op.all_outputs():
+                if graph.is_persistable(out_var) and out_var.name(
+                ) != param.name():
+                    params.append(out_var)
+        self._acc_cache[param.name()] = params
         return params
 
     def _forward_pruning_ralated_params(self,
@@ -318,7 +352,8 @@ class Pruner():
                                         lazy=False,
                                         only_graph=False,
                                         param_backup=None,
-                                        param_shape_backup=None):
+                                        param_shape_backup=None,
+                                        pruned_mask=None):
         """
         Pruning all the parameters affected by the pruning of given parameter.
         Args:
@@ -332,6 +367,7 @@ class Pruner():
                         False means cutting down the pruned elements.
             only_graph(bool): True means only modifying the graph.
                               False means modifying graph and variables in  scope.
+            pruned_mask(numpy.array): The boolean mask of pruned indexes. Default: None.
         """
         assert isinstance(
             graph,
@@ -355,10 +391,11 @@ class Pruner():
                 lazy=lazy,
                 only_graph=only_graph,
                 param_backup=param_backup,
-                param_shape_backup=param_shape_backup)
+                param_shape_backup=param_shape_backup,
+                pruned_mask=pruned_mask)
 
         else:
-            pruned_idxs = self._prune_filters_by_ratio(
+            pruned_idxs, pruned_mask = self._prune_filters_by_ratio(
                 scope, [param] + self._get_accumulator(graph, param),
                 ratio,
                 place,
@@ -367,14 +404,27 @@ class Pruner():
                 param_backup=param_backup,
                 param_shape_backup=param_shape_backup)
         self._prune_ops(related_ops, pruned_idxs, graph, scope, place, lazy,
-                        only_graph, param_backup, param_shape_backup)
-
-    def _prune_ops(self, ops, pruned_idxs, graph, scope, place, lazy,
-                   only_graph, param_backup, param_shape_backup):
+                        only_graph, param_backup, param_shape_backup,
+                        pruned_mask)
+
+    def _prune_ops(self,
+                   ops,
+                   pruned_idxs,
+                   graph,
+                   scope,
+                   place,
+                   lazy,
+                   only_graph,
+                   param_backup,
+                   param_shape_backup,
+                   pruned_mask=None):
+        # var name -> (position of the last op in ops outputting it,
+        #              negative position among that op's outputs)
+        output_pos = None
         for idx, op in enumerate(ops):
             if op.type() in ["conv2d", "deformable_conv"]:
                 for in_var in op.all_inputs():
-                    if graph.is_parameter(in_var):
+                    if in_var.name() in self._param_names:
                         conv_param = in_var
                         self._prune_parameter_by_idx(
                             scope, [conv_param] + self._get_accumulator(
@@ -385,10 +435,11 @@ class Pruner():
                             lazy=lazy,
                             only_graph=only_graph,
                             param_backup=param_backup,
-                            param_shape_backup=param_shape_backup)
+                            param_shape_backup=param_shape_backup,
+                            pruned_mask=pruned_mask)
             if op.type() == "depthwise_conv2d":
                 for in_var in op.all_inputs():
-                    if graph.is_parameter(in_var):
+                    if in_var.name() in self._param_names:
                         conv_param = in_var
                         self._prune_parameter_by_idx(
                             scope, [conv_param] + self._get_accumulator(
@@ -399,11 +450,12 @@ class Pruner():
                             lazy=lazy,
                             only_graph=only_graph,
                             param_backup=param_backup,
-                            param_shape_backup=param_shape_backup)
+                            param_shape_backup=param_shape_backup,
+                            pruned_mask=pruned_mask)
             elif op.type() == "elementwise_add":
                 # pruning bias
                 for in_var in op.all_inputs():
-                    if graph.is_parameter(in_var):
+                    if in_var.name() in self._param_names:
                         bias_param = in_var
                         self._prune_parameter_by_idx(
                             scope, [bias_param] + self._get_accumulator(
@@ -414,22 +466,22 @@ class Pruner():
                             lazy=lazy,
                             only_graph=only_graph,
                             param_backup=param_backup,
-                            param_shape_backup=param_shape_backup)
+                            param_shape_backup=param_shape_backup,
+                            pruned_mask=pruned_mask)
             elif op.type() == "mul":  # pruning fc layer
                 fc_input = None
                 fc_param = None
                 for in_var in op.all_inputs():
-                    if graph.is_parameter(in_var):
+                    if in_var.name() in self._param_names:
                         fc_param = in_var
                     else:
                         fc_input = in_var
 
-                idx = []
                 feature_map_size = fc_input.shape()[2] * fc_input.shape()[3]
-                range_idx = np.array(range(feature_map_size))
-                for i in pruned_idxs:
-                    idx += list(range_idx + i * feature_map_size)
-                corrected_idxs = idx
+                range_idx = np.arange(feature_map_size, dtype=np.int64)
+                pruned_channels = np.asarray(pruned_idxs, dtype=np.int64)
+                corrected_idxs = (pruned_channels[:, None] * feature_map_size +
+                                  range_idx).ravel()
                 self._prune_parameter_by_idx(
                     scope, [fc_param] + self._get_accumulator(graph, fc_param),
                     corrected_idxs,
@@ -442,15 +494,21 @@ class Pruner():
 
             elif op.type() == "concat":
                 concat_inputs = op.all_inputs()
-                last_op = ops[idx - 1]
+                if output_pos is None:
+                    output_pos = {}
+                    for i, related_op in enumerate(ops):
+                        outputs = related_op.all_outputs()
+                        for j in range(len(outputs) - 1, -1, -1):
+                            output_pos[outputs[j].name()] = (i, -j)
+                # the input outputted by the latest related op is the pruned one
                 concat_idx = None
-                for last_op in reversed(ops):
-                    for out_var in last_op.all_outputs():
-                        if out_var in concat_inputs:
-                            concat_idx = concat_inputs.index(out_var)
-                            break
-                    if concat_idx is not None:
-                        break
+                last_pos = None
+                for ci, concat_input in enumerate(concat_inputs):
+                    pos = output_pos.get(concat_input.name())
+                    if pos is not None and (last_pos is None or
+                                            pos > last_pos):
+                        last_pos = pos
+                        concat_idx = ci
                 offset = 0
                 for ci in range(concat_idx):
                     offset += concat_inputs[ci].shape()[1]
@@ -470,42 +528,23 @@ class Pruner():
                 mean = bn_inputs[1]
                 alpha = bn_inputs[2]
                 variance = bn_inputs[3]
-                self._prune_parameter_by_idx(
-                    scope, [mean] + self._get_accumulator(graph, mean),
-                    pruned_idxs,
-                    pruned_axis=0,
-                    place=place,
-                    lazy=lazy,
-                    only_graph=only_graph,
-                    param_backup=param_backup,
-                    param_shape_backup=param_shape_backup)
-                self._prune_parameter_by_idx(
-                    scope, [variance] + self._get_accumulator(graph, variance),
-                    pruned_idxs,
-                    pruned_axis=0,
-                    place=place,
-                    lazy=lazy,
-                    only_graph=only_graph,
-                    param_backup=param_backup,
-                    param_shape_backup=param_shape_backup)
-                self._prune_parameter_by_idx(
-                    scope, [alpha] + self._get_accumulator(graph, alpha),
-                    pruned_idxs,
-                    pruned_axis=0,
-                    place=place,
-                    lazy=lazy,
-                    only_graph=only_graph,
-                    param_backup=param_backup,
-                    param_shape_backup=param_shape_backup)
-                self._prune_parameter_by_idx(
-                    scope, [beta] + self._get_accumulator(graph, beta),
-                    pruned_idxs,
-                    pruned_axis=0,
-                    place=place,
-                    lazy=lazy,
-                    only_graph=only_graph,
-                    param_backup=param_backup,
-                    param_shape_backup=param_shape_backup)
+                bn_mask = pruned_mask
+                # the graph shape of a pruned batch_norm has already shrunk
+                if bn_mask is None and not (only_graph or lazy) and (
+                        mean.name() not in self.pruned_list[0]):
+                    bn_mask = self._idx_to_mask(pruned_idxs, mean.shape()[0])
+                for bn_param in [mean, variance, alpha, beta]:
+                    self._prune_parameter_by_idx(
+                        scope,
+                        [bn_param] + self._get_accumulator(graph, bn_param),
+                        pruned_idxs,
+                        pruned_axis=0,
+                        place=place,
+                        lazy=lazy,
+                        only_graph=only_graph,
+                        param_backup=param_backup,
+                        param_shape_backup=param_shape_backup,
+                        pruned_mask=bn_mask)
 
     def _prune_parameters(self,
                           graph,
@@ -532,9 +571,9 @@ class Pruner():
                               False means modifying graph and variables in  scope.
         """
         assert len(params) == len(ratios)
-        self.pruned_list = [[], []]
+        self.pruned_list = [set(), set()]
         for param, ratio in zip(params, ratios):
-            assert isinstance(param, str) or isinstance(param, unicode)
+            assert isinstance(param, six.string_types)
             if param in self.pruned_list[0]:
                 _logger.info("Skip {}".format(param))
                 continue
@@ -632,16 +671,40 @@ class Pruner():
                        If it is None, the value in self.pruning_axis will be used.
                        default: None.
         Returns:
-            list<int>: The indexes to be pruned on axis.
+            tuple: The indexes to be pruned on axis and the boolean mask of them.
         """
-        prune_num = int(round(param.shape[axis] * ratio))
-        reduce_dims = [i for i in range(len(param.shape)) if i != axis]
+        channel_num = param.shape[axis]
+        prune_num = int(round(channel_num * ratio))
+        flat = np.moveaxis(param, axis, 0).reshape(channel_num, -1)
         if self.criterion == 'l1_norm':
-            criterions = np.sum(np.abs(param), axis=tuple(reduce_dims))
-        pruned_idx = criterions.argsort()[:prune_num]
-        return pruned_idx
+            criterions = np.abs(flat).sum(axis=1)
+        if prune_num > 0:
+            # selection without fully sorting the criterions
+            pruned_idx = np.argpartition(criterions,
+                                         prune_num - 1)[:prune_num]
+        else:
+            pruned_idx = np.array([], dtype=np.int64)
+        return pruned_idx, self._idx_to_mask(pruned_idx, param.shape[axis])
 
-    def _prune_tensor(self, tensor, pruned_idx, pruned_axis, lazy=False):
+    def _idx_to_mask(self, pruned_idx, size):
+        """
+        Convert the indexes to be pruned into a boolean mask.
+        Args:
+            pruned_idx(list<int>): The indexes to be pruned.
+            size(int): The length of the pruned axis.
+        Returns:
+            numpy.array: A boolean array whose elements at pruned_idx are True.
+        """
+        mask = np.zeros(size, dtype=bool)
+        mask[pruned_idx] = True
+        return mask
+
+    def _prune_tensor(self,
+                      tensor,
+                      pruned_idx,
+                      pruned_axis,
+                      lazy=False,
+                      pruned_mask=None):
         """
         Pruning a array by indexes on given axis.
         Args:
@@ -651,20 +714,29 @@ class Pruner():
             lazy(bool): True means setting the pruned elements to zero.
                         False means remove the pruned elements from memory.
                         default: False.
+            pruned_mask(numpy.array): The boolean mask of pruned indexes.
+                                      It will be computed from pruned_idx if it is None.
+                                      It is not used when lazy is True.
+                                      default: None.
         Returns:
             numpy.array: The pruned array.
         """
-        mask = np.zeros(tensor.shape[pruned_axis], dtype=bool)
-        mask[pruned_idx] = True
-
-        def func(data):
-            return data[~mask]
-
-        def lazy_func(data):
-            data[mask] = 0
-            return data
-
         if lazy:
-            return np.apply_along_axis(lazy_func, pruned_axis, tensor)
+            idx = [slice(None)] * tensor.ndim
+            idx[pruned_axis] = np.asarray(pruned_idx, dtype=np.int64)
+            tensor[tuple(idx)] = 0
+            pruned_tensor = tensor
         else:
-            return np.apply_along_axis(func, pruned_axis, tensor)
+            mask = pruned_mask
+            if mask is None:
+                mask = self._idx_to_mask(pruned_idx, tensor.shape[pruned_axis])
+            if mask.shape[0] != tensor.shape[pruned_axis]:
+                # keep the same error type as indexing out of bounds
+                raise IndexError(
+                    "pruned mask of size {} mismatches axis {} with size {}".
+                    format(mask.shape[0], pruned_axis, tensor.shape[
+                        pruned_axis]))
+            pruned_tensor = tensor.compress(~mask, axis=pruned_axis)
+        # No copy is made here if the array is already contiguous in the
+        # original dtype, which lets fluid set the tensor without converting.
+        return np.ascontiguousarray(pruned_tensor, dtype=tensor.dtype)
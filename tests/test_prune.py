@@ -14,6 +14,7 @@
 import sys
 sys.path.append("../")
 import unittest
+import numpy as np
 import paddle.fluid as fluid
 from paddleslim.prune import Pruner
 from layers import conv_bn_layer
@@ -74,6 +75,159 @@ class TestPrune(unittest.TestCase):
             if "weights" in param.name:
                 self.assertTrue(param.shape == shapes[param.name])
 
+    def test_prune_concat_bn(self):
+        main_program = fluid.Program()
+        startup_program = fluid.Program()
+        #   X
+        # conv1--
+        #        |--> concat --> bn --> conv3
+        # conv2--
+        #   X
+        #
+        # X: prune output channels
+        with fluid.program_guard(main_program, startup_program):
+            input = fluid.data(name="image", shape=[None, 3, 16, 16])
+            conv1 = conv_bn_layer(input, 8, 3, "conv1")
+            conv2 = conv_bn_layer(input, 8, 3, "conv2")
+            concat = fluid.layers.concat([conv1, conv2], axis=1)
+            bn = fluid.layers.batch_norm(
+                input=concat,
+                param_attr=fluid.ParamAttr(name="concat_bn_scale"),
+                bias_attr=fluid.ParamAttr(name="concat_bn_offset"),
+                moving_mean_name="concat_bn_mean",
+                moving_variance_name="concat_bn_variance")
+            conv3 = conv_bn_layer(bn, 8, 3, "conv3")
+
+        place = fluid.CPUPlace()
+        exe = fluid.Executor(place)
+        scope = fluid.Scope()
+        exe.run(startup_program, scope=scope)
+        pruner = Pruner()
+        main_program, _, _ = pruner.prune(
+            main_program,
+            scope,
+            params=["conv1_weights", "conv2_weights"],
+            ratios=[0.5, 0.5],
+            place=place,
+            lazy=False,
+            only_graph=False)
+
+        shapes = {
+            "conv1_weights": (4, 3, 3, 3),
+            "conv2_weights": (4, 3, 3, 3),
+        }
+        for param in main_program.global_block().all_parameters():
+            if param.name in shapes:
+                self.assertTrue(param.shape == shapes[param.name])
+            tensor = np.array(scope.find_var(param.name).get_tensor())
+            self.assertTrue(tensor.shape == param.shape)
+
+    def test_prune_clone(self):
+        main_program = fluid.Program()
+        startup_program = fluid.Program()
+        with fluid.program_guard(main_program, startup_program):
+            input = fluid.data(name="image", shape=[None, 3, 16, 16])
+            conv1 = conv_bn_layer(input, 8, 3, "conv1")
+            conv2 = conv_bn_layer(conv1, 8, 3, "conv2")
+
+        place = fluid.CPUPlace()
+        scope = fluid.Scope()
+        pruner = Pruner()
+        ori_shapes = {
+            "conv1_weights": (8, 3, 3, 3),
+            "conv2_weights": (8, 8, 3, 3)
+        }
+        pruned_shapes = {
+            "conv1_weights": (4, 3, 3, 3),
+            "conv2_weights": (8, 4, 3, 3)
+        }
+
+        # The given program is kept unchanged by default.
+        pruned_program, _, _ = pruner.prune(
+            main_program,
+            scope,
+            params=["conv1_weights"],
+            ratios=[0.5],
+            place=place,
+            only_graph=True)
+        self.assertTrue(pruned_program is not main_program)
+        for param in main_program.global_block().all_parameters():
+            if "weights" in param.name:
+                self.assertTrue(param.shape == ori_shapes[param.name])
+        for param in pruned_program.global_block().all_parameters():
+            if "weights" in param.name:
+                self.assertTrue(param.shape == pruned_shapes[param.name])
+
+        # The given program is pruned in place without cloning.
+        pruned_program, _, _ = pruner.prune(
+            main_program,
+            scope,
+            params=["conv1_weights"],
+            ratios=[0.5],
+            place=place,
+            only_graph=True,
+            clone=False)
+        self.assertTrue(pruned_program is main_program)
+        for param in main_program.global_block().all_parameters():
+            if "weights" in param.name:
+                self.assertTrue(param.shape == pruned_shapes[param.name])
+
+
+class TestPruneTensor(unittest.TestCase):
+    def setUp(self):
+        self.pruner = Pruner()
+        self.tensor = np.arange(
+            4 * 6 * 3 * 3, dtype="float32").reshape((4, 6, 3, 3)) + 1
+
+    def test_cut(self):
+        for axis in [0, 1]:
+            for pruned_idx in [[2, 0], np.array([2, 0])]:
+                pruned = self.pruner._prune_tensor(
+                    self.tensor.copy(), pruned_idx, axis, lazy=False)
+                expected = np.delete(self.tensor, [0, 2], axis=axis)
+                self.assertTrue(np.array_equal(pruned, expected))
+                self.assertTrue(pruned.dtype == self.tensor.dtype)
+                self.assertTrue(pruned.flags["C_CONTIGUOUS"])
+
+    def test_lazy(self):
+        for axis in [0, 1]:
+            for pruned_idx in [[2, 0], np.array([2, 0]), []]:
+                pruned = self.pruner._prune_tensor(
+                    self.tensor.copy(), pruned_idx, axis, lazy=True)
+                expected = self.tensor.copy()
+                idx = [slice(None)] * expected.ndim
+                idx[axis] = list(pruned_idx)
+                expected[tuple(idx)] = 0
+                self.assertTrue(pruned.shape == self.tensor.shape)
+                self.assertTrue(np.array_equal(pruned, expected))
+
+    def test_mask(self):
+        mask = self.pruner._idx_to_mask([1], 6)
+        pruned = self.pruner._prune_tensor(
+            self.tensor.copy(), [1], 1, pruned_mask=mask)
+        self.assertTrue(
+            np.array_equal(pruned, np.delete(self.tensor, [1], axis=1)))
+        with self.assertRaises(IndexError):
+            self.pruner._prune_tensor(
+                self.tensor.copy(), [1], 0, pruned_mask=mask)
+
+    def test_cal_pruned_idx(self):
+        scale = np.array([3, 1, 4, 2], dtype="float32")
+        param = self.tensor * scale.reshape((4, 1, 1, 1))
+        param[1] *= -1
+        criterions = np.abs(param).sum(axis=(1, 2, 3))
+        for ratio in [0., 0.5, 1.]:
+            pruned_idx, mask = self.pruner._cal_pruned_idx(
+                "param", param, ratio, axis=0)
+            expected = criterions.argsort()[:int(round(4 * ratio))]
+            self.assertTrue(sorted(pruned_idx) == sorted(expected))
+            self.assertTrue(sorted(np.where(mask)[0]) == sorted(expected))
+
+        pruned_idx, _ = self.pruner._cal_pruned_idx(
+            "param", param, 0.5, axis=1)
+        expected = np.abs(param).sum(axis=(0, 2, 3)).argsort()[:3]
+        self.assertTrue(sorted(pruned_idx) == sorted(expected))
+
 
 if __name__ == '__main__':
     unittest.main()